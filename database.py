@@ -1,18 +1,44 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.orm import sessionmaker
 from models import Base
+import os
 
-DATABASE_URL = "sqlite:///./poi_network.db"
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./poi_network.db")
+
+# timeout is SQLite's busy timeout: writers from other worker processes wait instead of failing
+engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False, "timeout": 15})
+
+@event.listens_for(engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers in every worker proceed while one process writes
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def create_tables():
     Base.metadata.create_all(bind=engine)
+    upgrade_tables()
+
+def upgrade_tables():
+    # create_all only creates missing tables, so add any columns and indexes
+    # introduced after an existing database was first created
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
 
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
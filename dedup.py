@@ -0,0 +1,218 @@
+from array import array
+from typing import Dict, List, Optional, Set, Tuple
+import hashlib
+import random
+import re
+import threading
+
+from sqlalchemy.orm import Session, undefer
+from invalidation import TOPIC_SOLUTION_FINGERPRINTS, bump_version
+import models
+
+# MinHash parameters: 64 permutations split into 16 LSH bands of 4 rows.
+# Pairs above ~0.5 Jaccard become candidates; candidates are then confirmed
+# against the estimated similarity so only close copies get flagged.
+NUM_PERM = 64
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERM // LSH_BANDS
+SHINGLE_SIZE = 3
+DUPLICATE_THRESHOLD = 0.8
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_rng = random.Random(1)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERM)
+]
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def normalize_content(content: str) -> str:
+    return " ".join(_TOKEN_RE.findall(content.lower()))
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(normalize_content(content).encode("utf-8")).hexdigest()
+
+
+def _shingles(content: str) -> Set[int]:
+    tokens = normalize_content(content).split()
+    if len(tokens) < SHINGLE_SIZE:
+        grams = [" ".join(tokens)]
+    else:
+        grams = [" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)]
+    return {
+        int.from_bytes(hashlib.blake2b(gram.encode("utf-8"), digest_size=4).digest(), "little")
+        for gram in grams
+    }
+
+
+def compute_minhash(content: str) -> List[int]:
+    shingles = _shingles(content)
+    return [
+        min(((a * s + b) % _MERSENNE_PRIME) & _MAX_HASH for s in shingles)
+        for a, b in _PERMUTATIONS
+    ]
+
+
+def pack_signature(signature: List[int]) -> bytes:
+    return array("I", signature).tobytes()
+
+
+def unpack_signature(data: bytes) -> List[int]:
+    signature = array("I")
+    signature.frombytes(data)
+    return signature.tolist()
+
+
+def estimate_similarity(a: List[int], b: List[int]) -> float:
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_PERM
+
+
+class MinHashLSH:
+    """In-process LSH index over solution MinHash signatures."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._stale = False
+        # Highest solution id covered by a DB scan; rows inserted locally don't move it
+        self._synced_id = 0
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], Set[int]] = {}
+        self._entries: Dict[int, Tuple[int, List[int]]] = {}
+
+    def _band_keys(self, signature: List[int]):
+        for band in range(LSH_BANDS):
+            start = band * LSH_ROWS
+            yield band, tuple(signature[start:start + LSH_ROWS])
+
+    def _insert_locked(self, solution_id: int, solver_id: int, signature: List[int]):
+        if solution_id in self._entries:
+            return
+        self._entries[solution_id] = (solver_id, signature)
+        for key in self._band_keys(signature):
+            self._buckets.setdefault(key, set()).add(solution_id)
+
+    def load(self, db: Session):
+        """Build the index on first use, or pick up rows other workers added since."""
+        with self._lock:
+            if self._loaded and not self._stale:
+                return
+            rows = db.query(
+                models.Solution.id, models.Solution.solver_id, models.Solution.minhash_signature
+            ).filter(
+                models.Solution.id > self._synced_id,
+                models.Solution.minhash_signature.isnot(None)
+            ).order_by(models.Solution.id)
+            for solution_id, solver_id, data in rows:
+                self._insert_locked(solution_id, solver_id, unpack_signature(data))
+                self._synced_id = solution_id
+            self._loaded = True
+            self._stale = False
+
+    def invalidate(self):
+        self._stale = True
+
+    def insert(self, solution_id: int, solver_id: int, signature: List[int]):
+        with self._lock:
+            self._insert_locked(solution_id, solver_id, signature)
+
+    def query(self, signature: List[int], exclude_solver_id: Optional[int] = None) -> Tuple[Optional[int], float]:
+        """Return the most similar indexed solution from another solver and its score."""
+        with self._lock:
+            candidates: Set[int] = set()
+            for key in self._band_keys(signature):
+                candidates.update(self._buckets.get(key, ()))
+            best_id, best_score = None, 0.0
+            for candidate_id in candidates:
+                solver_id, other = self._entries[candidate_id]
+                if solver_id == exclude_solver_id:
+                    continue
+                score = estimate_similarity(signature, other)
+                if score > best_score or (score == best_score and (best_id is None or candidate_id < best_id)):
+                    best_id, best_score = candidate_id, score
+            return best_id, best_score
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+            self._entries.clear()
+            self._loaded = False
+            self._synced_id = 0
+
+
+solution_index = MinHashLSH()
+
+
+def check_duplicate(db: Session, content: str, solver_id: int):
+    """Fingerprint new content and look for exact or near-duplicate submissions.
+
+    Returns (content_hash, signature, duplicate_of_id, similarity_score).
+    Content with no word characters gets no signature and is never flagged,
+    since every such submission would otherwise hash the same.
+    """
+    digest = content_hash(content)
+    if not normalize_content(content):
+        return digest, None, None, 0.0
+    signature = compute_minhash(content)
+
+    exact = db.query(models.Solution.id).filter(
+        models.Solution.content_hash == digest,
+        models.Solution.solver_id != solver_id
+    ).order_by(models.Solution.id).first()
+    if exact:
+        return digest, signature, exact.id, 1.0
+
+    solution_index.load(db)
+    match_id, score = solution_index.query(signature, exclude_solver_id=solver_id)
+    if match_id is None or score < DUPLICATE_THRESHOLD:
+        return digest, signature, None, score
+    return digest, signature, match_id, score
+
+
+def backfill_duplicates(db: Session, batch_size: int = 500) -> int:
+    """Fingerprint solutions created before duplicate detection existed.
+
+    Rows are processed in id order so each one is only compared against
+    earlier submissions, matching what submit_solution would have recorded.
+    """
+    solution_index.load(db)
+    processed = 0
+    while True:
+        batch = db.query(models.Solution).options(undefer(models.Solution.content)).filter(
+            models.Solution.content_hash.is_(None)
+        ).order_by(models.Solution.id).limit(batch_size).all()
+        if not batch:
+            break
+        for solution in batch:
+            digest, signature, duplicate_of_id, score = check_duplicate(db, solution.content, solution.solver_id)
+            if duplicate_of_id is not None and duplicate_of_id > solution.id:
+                # Only earlier rows count as originals during a backfill
+                duplicate_of_id, score = None, 0.0
+            solution.content_hash = digest
+            solution.minhash_signature = pack_signature(signature) if signature else None
+            solution.duplicate_of_id = duplicate_of_id
+            solution.similarity_score = score
+            # Flush so the exact-hash lookup sees this row for the next ones
+            db.flush()
+            if signature:
+                solution_index.insert(solution.id, solution.solver_id, signature)
+        # Running API workers rebuild their LSH index to include these rows
+        bump_version(db, TOPIC_SOLUTION_FINGERPRINTS)
+        db.commit()
+        processed += len(batch)
+    return processed
+
+
+if __name__ == "__main__":
+    from database import SessionLocal, create_tables
+
+    create_tables()
+    db = SessionLocal()
+    try:
+        count = backfill_duplicates(db)
+        print(f"Backfilled duplicate fingerprints for {count} solutions")
+    finally:
+        db.close()
@@ -1,7 +1,7 @@
 import React, { useEffect, useState } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import { ArrowLeft, Clock, Coins, User, Send, CheckCircle, XCircle } from 'lucide-react';
-import { Problem, Solution } from '../types';
+import { Problem, SolutionPreview } from '../types';
 import { problemService, solutionService } from '../services/api';
 import { useAuth } from '../context/AuthContext';
 
@@ -10,19 +10,37 @@ export const ProblemDetail: React.FC = () => {
   const navigate = useNavigate();
   const { user } = useAuth();
   const [problem, setProblem] = useState<Problem | null>(null);
+  const [solutions, setSolutions] = useState<SolutionPreview[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [userHasSubmitted, setUserHasSubmitted] = useState(false);
+  const [fullContent, setFullContent] = useState<Record<number, string>>({});
+  const [expanding, setExpanding] = useState<number | null>(null);
   const [solution, setSolution] = useState('');
   const [loading, setLoading] = useState(true);
   const [submitting, setSubmitting] = useState(false);
   const [error, setError] = useState('');
   const [success, setSuccess] = useState('');
 
+  // Solutions are paged as previews; full content is fetched per solution on demand
+  const loadSolutions = async (problemId: number) => {
+    const page = await solutionService.getProblemSolutions(problemId);
+    setSolutions(page.items);
+    setNextCursor(page.next_cursor);
+    if (user) {
+      const own = await solutionService.getProblemSolutions(problemId, { solver_id: user.id, limit: 1 });
+      setUserHasSubmitted(own.items.length > 0);
+    }
+  };
+
   useEffect(() => {
     const fetchProblem = async () => {
       if (!id) return;
       
       try {
-        const data = await problemService.getProblem(parseInt(id));
+        const data = await problemService.getProblem(parseInt(id), false);
         setProblem(data);
+        await loadSolutions(data.id);
       } catch (err: any) {
         setError('Failed to load problem');
       } finally {
@@ -31,7 +49,34 @@ export const ProblemDetail: React.FC = () => {
     };
 
     fetchProblem();
-  }, [id]);
+  }, [id, user?.id]);
+
+  const handleLoadMore = async () => {
+    if (!problem || !nextCursor) return;
+
+    setLoadingMore(true);
+    try {
+      const page = await solutionService.getProblemSolutions(problem.id, { cursor: nextCursor });
+      setSolutions(current => [...current, ...page.items]);
+      setNextCursor(page.next_cursor);
+    } catch (err: any) {
+      setError('Failed to load more solutions');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
+  const handleShowFull = async (solutionId: number) => {
+    setExpanding(solutionId);
+    try {
+      const data = await solutionService.getSolution(solutionId);
+      setFullContent(current => ({ ...current, [solutionId]: data.content }));
+    } catch (err: any) {
+      setError('Failed to load solution');
+    } finally {
+      setExpanding(null);
+    }
+  };
 
   const handleSubmitSolution = async (e: React.FormEvent) => {
     e.preventDefault();
@@ -48,9 +93,8 @@ export const ProblemDetail: React.FC = () => {
       });
       setSuccess('Solution submitted successfully!');
       setSolution('');
-      // Refresh problem to show new solution
-      const updatedProblem = await problemService.getProblem(problem.id);
-      setProblem(updatedProblem);
+      // Refresh solutions to show the new one
+      await loadSolutions(problem.id);
     } catch (err: any) {
       setError(err.response?.data?.detail || 'Failed to submit solution');
     } finally {
@@ -116,8 +160,6 @@ export const ProblemDetail: React.FC = () => {
     );
   }
 
-  const userHasSubmitted = problem.solutions?.some(s => s.solver_id === user?.id);
-
   return (
     <div className="max-w-4xl mx-auto px-6 py-8">
       <button
@@ -203,12 +245,12 @@ export const ProblemDetail: React.FC = () => {
       {/* Solutions */}
       <div className="card">
         <h2 className="text-xl font-bold text-gray-900 mb-6">
-          Solutions ({problem.solutions?.length || 0})
+          Solutions ({solutions.length}{nextCursor ? '+' : ''})
         </h2>
         
-        {problem.solutions && problem.solutions.length > 0 ? (
+        {solutions.length > 0 ? (
           <div className="space-y-6">
-            {problem.solutions.map((sol: Solution) => (
+            {solutions.map((sol: SolutionPreview) => (
               <div key={sol.id} className="border border-gray-200 rounded-lg p-6">
                 <div className="flex items-center justify-between mb-4">
                   <div className="flex items-center space-x-3">
@@ -232,9 +274,31 @@ export const ProblemDetail: React.FC = () => {
                     </span>
                   </div>
                 </div>
-                <p className="text-gray-700 leading-relaxed whitespace-pre-wrap">{sol.content}</p>
+                <p className="text-gray-700 leading-relaxed whitespace-pre-wrap">
+                  {fullContent[sol.id] ?? sol.preview}
+                </p>
+                {fullContent[sol.id] === undefined && sol.content_length > sol.preview.length && (
+                  <button
+                    onClick={() => handleShowFull(sol.id)}
+                    disabled={expanding === sol.id}
+                    className="mt-2 text-sm font-medium text-primary-600 hover:text-primary-700 disabled:opacity-50"
+                  >
+                    {expanding === sol.id ? 'Loading...' : 'Show full solution'}
+                  </button>
+                )}
               </div>
             ))}
+            {nextCursor && (
+              <div className="flex justify-center">
+                <button
+                  onClick={handleLoadMore}
+                  disabled={loadingMore}
+                  className="btn-primary disabled:opacity-50 disabled:cursor-not-allowed"
+                >
+                  {loadingMore ? 'Loading...' : 'Load more solutions'}
+                </button>
+              </div>
+            )}
           </div>
         ) : (
           <div className="text-center py-8 text-gray-500">
@@ -1,6 +1,6 @@
 import axios from 'axios';
 import type { 
-  User, Problem, Solution, AuthResponse, LoginRequest, SignupRequest, 
+  User, Problem, Solution, SolutionPage, AuthResponse, LoginRequest, SignupRequest, 
   ProblemCreateRequest, SolutionCreateRequest, ValidationCreateRequest,
   Transaction, ReputationLevel, ProblemStatus
 } from '../types';
@@ -62,8 +62,10 @@ export const problemService = {
     return response.data;
   },
 
-  async getProblem(id: number): Promise<Problem> {
-    const response = await api.get(`/problems/${id}`);
+  async getProblem(id: number, includeSolutions = true): Promise<Problem> {
+    const response = await api.get(`/problems/${id}`, {
+      params: { include_solutions: includeSolutions }
+    });
     return response.data;
   },
 
@@ -82,6 +84,19 @@ export const solutionService = {
   async getPendingSolutions(): Promise<Solution[]> {
     const response = await api.get('/solutions/pending');
     return response.data;
+  },
+
+  async getProblemSolutions(
+    problemId: number,
+    params: { cursor?: string; solver_id?: number; limit?: number } = {}
+  ): Promise<SolutionPage> {
+    const response = await api.get(`/problems/${problemId}/solutions`, { params });
+    return response.data;
+  },
+
+  async getSolution(id: number): Promise<Solution> {
+    const response = await api.get(`/solutions/${id}`);
+    return response.data;
   }
 };
 
@@ -16,7 +16,8 @@ export interface Problem {
   reward_amount: number;
   is_active: boolean;
   created_at: string;
-  solutions?: Solution[];
+  solutions?: SolutionPreview[];
+  solutions_next_cursor?: string | null;
 }
 
 export interface Solution {
@@ -30,6 +31,16 @@ export interface Solution {
   problem?: Problem;
 }
 
+export interface SolutionPreview extends Omit<Solution, 'content' | 'problem'> {
+  preview: string;
+  content_length: number;
+}
+
+export interface SolutionPage {
+  items: SolutionPreview[];
+  next_cursor: string | null;
+}
+
 export interface Validation {
   id: number;
   solution_id: number;
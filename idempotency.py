@@ -0,0 +1,181 @@
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple, Type
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+
+from fastapi import HTTPException, status
+from fastapi.responses import Response
+from pydantic import BaseModel
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+import models
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAY_HEADER = "Idempotent-Replayed"
+KEY_TTL = timedelta(hours=24)
+# How often expired keys are swept out of the table
+EVICTION_INTERVAL_SECONDS = 300
+
+# How long a retry waits for an in-flight request with the same key before
+# getting a 409 instead
+IN_FLIGHT_WAIT_SECONDS = 10.0
+
+# Per (user, key) locks so concurrent retries in this process wait for the
+# first request instead of redoing the work. They are asyncio locks, only
+# touched from the event loop, so a waiting retry holds no threadpool thread.
+# Entries are reference counted and dropped once nobody holds or waits on them.
+_in_flight: Dict[Tuple[int, str], List] = {}
+_last_eviction = 0.0
+_eviction_lock = threading.Lock()
+
+
+def request_fingerprint(endpoint: str, payload: BaseModel) -> str:
+    data = f"{endpoint}\n{payload.model_dump_json()}".encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def evict_expired_keys(db: Session):
+    cutoff = datetime.utcnow() - KEY_TTL
+    deleted = db.query(models.IdempotencyKey).filter(
+        models.IdempotencyKey.created_at < cutoff
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+
+def _run_on_commit(on_commit: Optional[Callable[[], None]]):
+    # The write is already committed, so a failing side effect must not turn it into an error
+    if on_commit is None:
+        return
+    try:
+        on_commit()
+    except Exception:
+        logger.exception("Post-commit hook failed")
+
+
+def _maybe_evict():
+    global _last_eviction
+    now = time.monotonic()
+    with _eviction_lock:
+        if now - _last_eviction < EVICTION_INTERVAL_SECONDS:
+            return
+        _last_eviction = now
+    from database import SessionLocal
+    db = SessionLocal()
+    try:
+        evict_expired_keys(db)
+    finally:
+        db.close()
+
+
+class IdempotentRequest:
+    """Replays stored responses for retried writes carrying an Idempotency-Key.
+
+    The key row is written in the same transaction as the endpoint's own
+    changes, so a response is only ever stored for work that committed.
+    Without a key every method degrades to a plain commit.
+    """
+
+    def __init__(self, db: Session, user_id: int, key: Optional[str]):
+        self.db = db
+        self.user_id = user_id
+        self.key = key
+        self.endpoint: Optional[str] = None
+        self.request_hash: Optional[str] = None
+
+    @asynccontextmanager
+    async def in_flight(self):
+        if self.key is None:
+            yield self
+            return
+        slot_key = (self.user_id, self.key)
+        slot = _in_flight.setdefault(slot_key, [asyncio.Lock(), 0])
+        slot[1] += 1
+        if slot[0].locked():
+            # Hand the pooled connection back while waiting; the session
+            # reconnects on next use and reloads whatever it had loaded
+            self.db.rollback()
+        try:
+            try:
+                await asyncio.wait_for(slot[0].acquire(), IN_FLIGHT_WAIT_SECONDS)
+            except asyncio.TimeoutError:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="A request with this Idempotency-Key is still in progress"
+                )
+            try:
+                yield self
+            finally:
+                slot[0].release()
+        finally:
+            slot[1] -= 1
+            if slot[1] == 0:
+                del _in_flight[slot_key]
+
+    def _stored_response(self) -> Optional[Response]:
+        record = self.db.query(models.IdempotencyKey).filter(
+            models.IdempotencyKey.user_id == self.user_id,
+            models.IdempotencyKey.key == self.key
+        ).first()
+        if record is None:
+            return None
+        if record.created_at < datetime.utcnow() - KEY_TTL:
+            # Expired but not swept yet; drop it with this request's write
+            self.db.delete(record)
+            self.db.flush()
+            return None
+        if record.endpoint != self.endpoint or record.request_hash != self.request_hash:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency key was already used for a different request"
+            )
+        return Response(
+            content=record.response_body,
+            status_code=record.status_code,
+            media_type="application/json",
+            headers={REPLAY_HEADER: "true"}
+        )
+
+    def replay(self, endpoint: str, payload: BaseModel) -> Optional[Response]:
+        """Return the stored response if this key already completed, else None."""
+        if self.key is None:
+            return None
+        self.endpoint = endpoint
+        self.request_hash = request_fingerprint(endpoint, payload)
+        _maybe_evict()
+        return self._stored_response()
+
+    def commit(self, obj, schema: Type[BaseModel], on_commit: Optional[Callable[[], None]] = None):
+        if self.key is None:
+            self.db.commit()
+            self.db.refresh(obj)
+            _run_on_commit(on_commit)
+            return obj
+
+        self.db.flush()
+        body = schema.model_validate(obj).model_dump_json().encode("utf-8")
+        self.db.add(models.IdempotencyKey(
+            user_id=self.user_id,
+            key=self.key,
+            endpoint=self.endpoint,
+            request_hash=self.request_hash,
+            status_code=status.HTTP_200_OK,
+            response_body=body
+        ))
+        try:
+            self.db.commit()
+        except IntegrityError:
+            # Another worker process committed the same key first
+            self.db.rollback()
+            stored = self._stored_response()
+            if stored is None:
+                raise
+            return stored
+        _run_on_commit(on_commit)
+        return Response(content=body, media_type="application/json")
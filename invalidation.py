@@ -0,0 +1,107 @@
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+import logging
+import os
+import threading
+
+from sqlalchemy import text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+import models
+
+logger = logging.getLogger(__name__)
+
+# Topics bumped by writes that in-process caches depend on
+TOPIC_PROBLEMS = "problems"
+TOPIC_SOLUTIONS = "solutions"
+TOPIC_SOLUTION_FINGERPRINTS = "solution_fingerprints"  # Bulk rewrites, e.g. the dedup backfill
+
+# Upper bound on how long another worker's write can go unnoticed
+POLL_INTERVAL_SECONDS = float(os.getenv("CACHE_POLL_INTERVAL_SECONDS", "0.25"))
+
+
+def bump_version(db: Session, topic: str):
+    """Mark a topic as changed; call before committing the write it describes."""
+    stmt = sqlite_insert(models.CacheVersion).values(topic=topic, version=1)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["topic"],
+        set_={"version": models.CacheVersion.version + 1}
+    ))
+
+
+class CacheInvalidator:
+    """Polls the cache_versions table and fires callbacks for changed topics.
+
+    Every worker process runs one of these. PRAGMA data_version only changes
+    when another connection has committed, so idle polls cost one pragma and
+    the versions table is read only after some write happened.
+    """
+
+    def __init__(self, interval: float = POLL_INTERVAL_SECONDS, engine=None):
+        self.interval = interval
+        self._engine = engine  # Defaults to the app's engine on first poll
+        self._callbacks: Dict[str, List[Callable[[], None]]] = defaultdict(list)
+        self._versions: Dict[str, int] = {}
+        self._data_version: Optional[int] = None
+        self._conn = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def register(self, topic: str, callback: Callable[[], None]):
+        self._callbacks[topic].append(callback)
+
+    def poll(self) -> List[str]:
+        """Return the topics that changed since the last poll, firing their callbacks."""
+        if self._conn is None:
+            if self._engine is None:
+                from database import engine
+                self._engine = engine
+            # A dedicated connection, since data_version is tracked per connection
+            self._conn = self._engine.connect()
+        try:
+            data_version = self._conn.execute(text("PRAGMA data_version")).scalar()
+            if data_version == self._data_version:
+                return []
+            rows = self._conn.execute(text("SELECT topic, version FROM cache_versions")).all()
+        finally:
+            self._conn.rollback()
+        first_poll = self._data_version is None
+        self._data_version = data_version
+
+        changed = [topic for topic, version in rows if self._versions.get(topic) != version]
+        self._versions.update(rows)
+        if first_poll:
+            # Nothing is cached before the first poll, so this only sets the baseline
+            return []
+        for topic in changed:
+            for callback in self._callbacks.get(topic, ()):
+                callback()
+        return changed
+
+    def run_forever(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Cache invalidation poll failed")
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self.poll()
+        self._thread = threading.Thread(target=self.run_forever, name="cache-invalidator", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+            self._data_version = None
+
+
+cache_invalidator = CacheInvalidator()
@@ -1,17 +1,51 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
+from contextlib import asynccontextmanager
+from sqlalchemy import and_, func, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload, undefer
 from typing import List, Optional
+from datetime import datetime
+import base64
+import json
 import models
 import schemas
 from database import engine, get_db, create_tables
 from auth import verify_password, get_password_hash, create_access_token, verify_token
+from dedup import check_duplicate, pack_signature, solution_index
+from related import problem_index
+from idempotency import IDEMPOTENCY_HEADER, IdempotentRequest
+from settlement import (
+    RUN_IN_PROCESS_WORKER, SETTLEMENT_MODE, SOLVER_REPUTATION, VALIDATOR_REPUTATION,
+    VALIDATOR_REWARD_RATE, enqueue_settlement, settlement_stats, settlement_worker
+)
+from invalidation import (
+    TOPIC_PROBLEMS, TOPIC_SOLUTIONS, TOPIC_SOLUTION_FINGERPRINTS, bump_version, cache_invalidator
+)
 import os
 
-app = FastAPI(title="Proof-of-Intelligence Network", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Refresh in-process indexes when another worker process writes
+    cache_invalidator.register(TOPIC_PROBLEMS, problem_index.invalidate)
+    cache_invalidator.register(TOPIC_SOLUTIONS, solution_index.invalidate)
+    cache_invalidator.register(TOPIC_SOLUTION_FINGERPRINTS, solution_index.clear)
+    cache_invalidator.start()
+    # Build or reload the related-problems index off the request path
+    problem_index.start()
+    # Drain the reward settlement outbox in the background. This runs in every
+    # mode, so rewards queued before a switch back to sync still get paid
+    if RUN_IN_PROCESS_WORKER:
+        settlement_worker.start()
+    yield
+    settlement_worker.stop()
+    problem_index.stop()
+    cache_invalidator.stop()
+
+app = FastAPI(title="Proof-of-Intelligence Network", version="1.0.0", lifespan=lifespan)
 
 # CORS middleware for frontend integration
 app.add_middleware(
@@ -25,6 +59,10 @@ app.add_middleware(
 # Create database tables
 create_tables()
 
+# Defaults for paginated solution listings
+SOLUTION_PAGE_SIZE = 20
+SOLUTION_PREVIEW_LENGTH = 280
+
 # Helper function to calculate reputation level
 def get_reputation_level(reputation: int):
     if reputation < 100:
@@ -62,6 +100,77 @@ def create_transaction(db: Session, user_id: int, transaction_type: str, amount:
     db.add(transaction)
     return transaction
 
+# Helper functions for opaque keyset-pagination cursors over (created_at, id)
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    data = json.dumps([created_at.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+# Helper function to turn index matches into active related problems
+def get_related_problems(db: Session, matches: list, limit: int):
+    scores = dict(matches)
+    problems = db.query(models.Problem).filter(
+        models.Problem.id.in_(scores.keys()),
+        models.Problem.is_active.is_(True)
+    ).all()
+    problems.sort(key=lambda p: scores[p.id], reverse=True)
+    return [
+        {**schemas.Problem.model_validate(p).model_dump(), "similarity": scores[p.id]}
+        for p in problems[:limit]
+    ]
+
+# Helper function to list one page of solution previews for a problem
+def get_solution_page(
+    db: Session,
+    problem_id: int,
+    status_filter: Optional[str] = None,
+    solver_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = SOLUTION_PAGE_SIZE,
+    preview_length: int = SOLUTION_PREVIEW_LENGTH
+):
+    # Only a prefix of content is read; the full text stays deferred
+    query = db.query(
+        models.Solution,
+        func.substr(models.Solution.content, 1, preview_length),
+        func.length(models.Solution.content)
+    ).options(joinedload(models.Solution.solver)).filter(models.Solution.problem_id == problem_id)
+    if status_filter:
+        query = query.filter(models.Solution.status == status_filter)
+    if solver_id is not None:
+        query = query.filter(models.Solution.solver_id == solver_id)
+    if cursor:
+        created_at, last_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            models.Solution.created_at > created_at,
+            and_(models.Solution.created_at == created_at, models.Solution.id > last_id)
+        ))
+    rows = query.order_by(models.Solution.created_at.asc(), models.Solution.id.asc()).limit(limit + 1).all()
+    
+    items = [
+        schemas.SolutionPreview(
+            **schemas.SolutionSummary.model_validate(solution).model_dump(),
+            preview=preview,
+            content_length=content_length
+        )
+        for solution, preview, content_length in rows[:limit]
+    ]
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1][0]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return {"items": items, "next_cursor": next_cursor}
+
 # Static files and frontend serving for production
 if os.path.exists("static"):
     app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -82,6 +191,16 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
         )
     return user
 
+async def get_idempotent_request(
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER, max_length=255),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    # Concurrent retries with the same key wait here, on the event loop, for the first one to finish
+    request = IdempotentRequest(db, current_user.id, idempotency_key)
+    async with request.in_flight():
+        yield request
+
 # Auth endpoints
 @app.post("/auth/signup", response_model=schemas.Token)
 def signup(user_data: schemas.UserCreate, db: Session = Depends(get_db)):
@@ -141,8 +260,13 @@ def get_user_transactions(current_user: models.User = Depends(get_current_user),
 def create_problem(
     problem_data: schemas.ProblemCreate, 
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: models.User = Depends(get_current_user),
+    idempotent: IdempotentRequest = Depends(get_idempotent_request)
 ):
+    replay = idempotent.replay("POST /problems", problem_data)
+    if replay is not None:
+        return replay
+    
     # Check if user has enough tokens
     if current_user.token_balance < problem_data.reward_amount:
         raise HTTPException(
@@ -169,32 +293,108 @@ def create_problem(
         f"Posted problem: {problem_data.title}", problem_id=problem.id
     )
     
-    db.commit()
-    db.refresh(problem)
-    return problem
+    # Other workers refresh their related-problems index from this bump
+    bump_version(db, TOPIC_PROBLEMS)
+    
+    # Keep the related-problems index current
+    def index_problem():
+        problem_index.add(problem.id, problem.title, problem.description)
+    
+    return idempotent.commit(problem, schemas.Problem, on_commit=index_problem)
 
 @app.get("/problems", response_model=List[schemas.Problem])
 def get_problems(db: Session = Depends(get_db)):
     problems = db.query(models.Problem).filter(models.Problem.is_active.is_(True)).all()
     return problems
 
+@app.get("/problems/similar", response_model=List[schemas.RelatedProblem])
+def find_similar_problems(
+    title: str,
+    description: str = "",
+    limit: int = Query(5, ge=1, le=50),
+    db: Session = Depends(get_db)
+):
+    # Lets the post form warn about existing bounties before a duplicate is created
+    # Empty until the background build of the index has finished
+    matches = problem_index.search(title, description, limit=limit * 2)
+    return get_related_problems(db, matches, limit)
+
 @app.get("/problems/{problem_id}", response_model=schemas.ProblemWithSolutions)
-def get_problem(problem_id: int, db: Session = Depends(get_db)):
+def get_problem(
+    problem_id: int,
+    include_solutions: bool = True,
+    solutions_limit: int = Query(SOLUTION_PAGE_SIZE, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    problem = db.query(models.Problem).filter(models.Problem.id == problem_id).first()
+    if not problem:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Problem not found"
+        )
+    response = schemas.Problem.model_validate(problem).model_dump()
+    if not include_solutions:
+        return {**response, "solutions": []}
+    # Only the first page of previews is embedded; the rest comes from /problems/{id}/solutions
+    page = get_solution_page(db, problem_id, limit=solutions_limit)
+    return {**response, "solutions": page["items"], "solutions_next_cursor": page["next_cursor"]}
+
+@app.get("/problems/{problem_id}/solutions", response_model=schemas.SolutionPage)
+def get_problem_solutions(
+    problem_id: int,
+    status_filter: Optional[str] = Query(None, alias="status", pattern="^(pending|approved|rejected)$"),
+    solver_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(SOLUTION_PAGE_SIZE, ge=1, le=100),
+    preview_length: int = Query(SOLUTION_PREVIEW_LENGTH, ge=0, le=2000),
+    db: Session = Depends(get_db)
+):
+    problem = db.query(models.Problem.id).filter(models.Problem.id == problem_id).first()
+    if not problem:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Problem not found"
+        )
+    return get_solution_page(
+        db, problem_id, status_filter=status_filter, solver_id=solver_id,
+        cursor=cursor, limit=limit, preview_length=preview_length
+    )
+
+@app.get("/problems/{problem_id}/related", response_model=List[schemas.RelatedProblem])
+def get_problem_related(
+    problem_id: int,
+    limit: int = Query(5, ge=1, le=50),
+    db: Session = Depends(get_db)
+):
     problem = db.query(models.Problem).filter(models.Problem.id == problem_id).first()
     if not problem:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Problem not found"
         )
-    return problem
+    
+    # Over-fetch so inactive problems can be dropped without coming up short
+    matches = problem_index.related(problem.id, limit=limit * 2)
+    if not matches:
+        # Not indexed until the background catch-up sees it, e.g. when another
+        # worker just created it; score its text against the index meanwhile
+        matches = problem_index.search(
+            problem.title, problem.description, limit=limit * 2, exclude_id=problem.id
+        )
+    return get_related_problems(db, matches, limit)
 
 # Solution endpoints
 @app.post("/solutions", response_model=schemas.Solution)
 def submit_solution(
     solution_data: schemas.SolutionCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: models.User = Depends(get_current_user),
+    idempotent: IdempotentRequest = Depends(get_idempotent_request)
 ):
+    replay = idempotent.replay("POST /solutions", solution_data)
+    if replay is not None:
+        return replay
+    
     # Check if problem exists
     problem = db.query(models.Problem).filter(models.Problem.id == solution_data.problem_id).first()
     if not problem:
@@ -215,18 +415,33 @@ def submit_solution(
             detail="You have already submitted a solution for this problem"
         )
     
+    # Flag exact and near-duplicate copies of other users' submissions
+    digest, signature, duplicate_of_id, similarity_score = check_duplicate(
+        db, solution_data.content, current_user.id
+    )
+    
     solution = models.Solution(
         content=solution_data.content,
         problem_id=solution_data.problem_id,
-        solver_id=current_user.id
+        solver_id=current_user.id,
+        content_hash=digest,
+        minhash_signature=pack_signature(signature) if signature else None,
+        duplicate_of_id=duplicate_of_id,
+        similarity_score=similarity_score
     )
     db.add(solution)
-    db.commit()
-    db.refresh(solution)
-    return solution
+    bump_version(db, TOPIC_SOLUTIONS)
+    
+    # Make the fingerprint visible to later submissions; empty content has none
+    def index_solution():
+        if signature:
+            solution_index.insert(solution.id, current_user.id, signature)
+    
+    return idempotent.commit(solution, schemas.Solution, on_commit=index_solution)
 
 @app.get("/solutions/pending", response_model=List[schemas.SolutionWithProblem])
 def get_pending_solutions(
+    max_similarity: Optional[float] = None,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
@@ -236,16 +451,44 @@ def get_pending_solutions(
             detail="Only validators can access pending solutions"
         )
     
-    solutions = db.query(models.Solution).filter(models.Solution.status == "pending").all()
+    query = db.query(models.Solution).options(undefer(models.Solution.content)).filter(
+        models.Solution.status == "pending"
+    )
+    if max_similarity is not None:
+        query = query.filter(func.coalesce(models.Solution.similarity_score, 0.0) <= max_similarity)
+    
+    # Likely duplicates sink to the bottom of the review queue
+    solutions = query.order_by(
+        func.coalesce(models.Solution.similarity_score, 0.0).asc(),
+        models.Solution.created_at.asc()
+    ).all()
     return solutions
 
+@app.get("/solutions/{solution_id}", response_model=schemas.Solution)
+def get_solution(solution_id: int, db: Session = Depends(get_db)):
+    # The one place a single solution's full content is loaded
+    solution = db.query(models.Solution).options(undefer(models.Solution.content)).filter(
+        models.Solution.id == solution_id
+    ).first()
+    if not solution:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Solution not found"
+        )
+    return solution
+
 # Validation endpoints
 @app.post("/validations", response_model=schemas.Validation)
 def validate_solution(
     validation_data: schemas.ValidationCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: models.User = Depends(get_current_user),
+    idempotent: IdempotentRequest = Depends(get_idempotent_request)
 ):
+    replay = idempotent.replay("POST /validations", validation_data)
+    if replay is not None:
+        return replay
+    
     if not current_user.is_validator:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -275,25 +518,48 @@ def validate_solution(
     )
     db.add(validation)
     
-    # Update solution status
-    db.query(models.Solution).filter(models.Solution.id == validation_data.solution_id).update({"status": validation_data.decision})
+    # Update solution status, unless a concurrent validation got there first
+    updated = db.query(models.Solution).filter(
+        models.Solution.id == validation_data.solution_id,
+        models.Solution.status == "pending"
+    ).update({"status": validation_data.decision})
+    if not updated:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Solution has already been validated"
+        )
     
     # If approved, reward the solver and validator
-    if validation_data.decision == "approved":
+    if validation_data.decision == "approved" and SETTLEMENT_MODE == "async":
+        # Rewards are applied later in batches by the settlement worker
+        problem = db.query(models.Problem).filter(models.Problem.id == solution.problem_id).first()
+        if problem:
+            enqueue_settlement(db, solution, problem, current_user.id)
+            try:
+                db.flush()
+            except IntegrityError:
+                # Another validator's approval already queued this solution's rewards
+                db.rollback()
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Solution has already been validated"
+                )
+    elif validation_data.decision == "approved":
         solver = db.query(models.User).filter(models.User.id == solution.solver_id).first()
         problem = db.query(models.Problem).filter(models.Problem.id == solution.problem_id).first()
         if solver and problem:
             # Reward solver
             db.query(models.User).filter(models.User.id == solver.id).update({
                 "token_balance": models.User.token_balance + problem.reward_amount,
-                "reputation": models.User.reputation + 10
+                "reputation": models.User.reputation + SOLVER_REPUTATION
             })
             
             # Reward validator (5% of problem reward)
-            validator_reward = problem.reward_amount * 0.05
+            validator_reward = problem.reward_amount * VALIDATOR_REWARD_RATE
             db.query(models.User).filter(models.User.id == current_user.id).update({
                 "token_balance": models.User.token_balance + validator_reward,
-                "reputation": models.User.reputation + 5
+                "reputation": models.User.reputation + VALIDATOR_REPUTATION
             })
             
             # Create transaction records
@@ -307,9 +573,7 @@ def validate_solution(
                 f"Validated solution for: {problem.title}", problem_id=problem.id, solution_id=solution.id
             )
     
-    db.commit()
-    db.refresh(validation)
-    return validation
+    return idempotent.commit(validation, schemas.Validation)
 
 # Stats endpoint
 @app.get("/stats")
@@ -326,6 +590,11 @@ def get_stats(db: Session = Depends(get_db)):
         "pending_solutions": pending_solutions
     }
 
+@app.get("/stats/settlement")
+def get_settlement_stats(db: Session = Depends(get_db)):
+    # lag_seconds is the age of the oldest unsettled reward
+    return settlement_stats(db)
+
 @app.get("/problems/{problem_id}/status")
 def get_problem_status(problem_id: int, db: Session = Depends(get_db)):
     problem = db.query(models.Problem).filter(models.Problem.id == problem_id).first()
@@ -355,4 +624,10 @@ def get_problem_status(problem_id: int, db: Session = Depends(get_db)):
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # Tables are created above before the workers fork, so they never race on DDL.
+    # Each worker process keeps its own caches in sync through cache_invalidator.
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    if workers > 1:
+        uvicorn.run("main:app", host="0.0.0.0", port=int(os.getenv("PORT", "8000")), workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", "8000")))
\ No newline at end of file
@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Float
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Float, Index, LargeBinary, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, relationship
 from datetime import datetime
 
 Base = declarative_base()
@@ -39,14 +39,24 @@ class Problem(Base):
 
 class Solution(Base):
     __tablename__ = "solutions"
+    __table_args__ = (
+        # Serves the per-problem solution listing, optionally filtered by status
+        Index("ix_solutions_problem_status_created", "problem_id", "status", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    content = Column(Text, nullable=False)
+    content = deferred(Column(Text, nullable=False))  # Loaded on access or with undefer()
     problem_id = Column(Integer, ForeignKey("problems.id"), nullable=False)
     solver_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     status = Column(String(20), default="pending")  # pending, approved, rejected
     created_at = Column(DateTime, default=datetime.utcnow)
-    
+
+    # Duplicate detection (see dedup.py)
+    content_hash = Column(String(64), index=True, nullable=True)  # sha256 of normalized content
+    minhash_signature = Column(LargeBinary, nullable=True)
+    duplicate_of_id = Column(Integer, ForeignKey("solutions.id"), nullable=True)
+    similarity_score = Column(Float, nullable=True)  # 1.0 for exact copies
+
     # Relationships
     problem = relationship("Problem", back_populates="solutions")
     solver = relationship("User", back_populates="submitted_solutions")
@@ -81,4 +91,37 @@ class Transaction(Base):
     # Relationships
     user = relationship("User")
     problem = relationship("Problem")
-    solution = relationship("Solution")
\ No newline at end of file
+    solution = relationship("Solution")
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (UniqueConstraint("user_id", "key"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    key = Column(String(255), nullable=False)
+    endpoint = Column(String(100), nullable=False)  # e.g. "POST /problems"
+    request_hash = Column(String(64), nullable=False)  # sha256 of endpoint and request body
+    status_code = Column(Integer, nullable=False)
+    response_body = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class Settlement(Base):
+    __tablename__ = "settlements"
+
+    id = Column(Integer, primary_key=True, index=True)
+    solution_id = Column(Integer, ForeignKey("solutions.id"), unique=True, nullable=False)  # One payout per solution
+    problem_id = Column(Integer, ForeignKey("problems.id"), nullable=False)
+    solver_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    validator_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    solver_reward = Column(Float, nullable=False)
+    validator_reward = Column(Float, nullable=False)
+    batch_id = Column(String(32), index=True, nullable=True)  # Worker batch that settled this row
+    created_at = Column(DateTime, default=datetime.utcnow)
+    settled_at = Column(DateTime, index=True, nullable=True)  # NULL while pending
+
+class CacheVersion(Base):
+    __tablename__ = "cache_versions"
+
+    topic = Column(String(50), primary_key=True)  # See invalidation.py
+    version = Column(Integer, nullable=False, default=0)
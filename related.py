@@ -0,0 +1,343 @@
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+import logging
+import math
+import os
+import re
+import tempfile
+import threading
+
+import numpy as np
+from scipy import sparse
+import models
+
+logger = logging.getLogger(__name__)
+
+INDEX_PATH = os.getenv("PROBLEM_INDEX_PATH", "./problem_index.npz")
+INDEX_VERSION = 2
+# Title terms count twice so short titles are not drowned out by long descriptions
+TITLE_WEIGHT = 2
+# New problems sit in a small delta matrix until this many have accumulated
+COMPACT_EVERY = 200
+# Persist after this many new problems; anything newer is caught up from the DB on load
+SAVE_EVERY = 50
+# How often the maintenance thread wakes up when nothing signals it
+MAINTENANCE_INTERVAL_SECONDS = 1.0
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset("""
+a an and are as at be but by can for from how i if in into is it its me my no not of on or
+so that the their then there these this to was we what when which while who why will with
+you your do does should would could need using use
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in _TOKEN_RE.findall(text.lower()) if len(token) > 1 and token not in _STOPWORDS]
+
+
+def problem_terms(title: str, description: str) -> Dict[str, int]:
+    counts = Counter(tokenize(description))
+    for token in tokenize(title):
+        counts[token] += TITLE_WEIGHT
+    return dict(counts)
+
+
+def _matrix(rows: List[Tuple[np.ndarray, np.ndarray]], n_cols: int) -> sparse.csc_matrix:
+    """Stack (columns, log-tf) rows into a CSC matrix, one row per problem."""
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(cols) for cols, _ in rows])
+    if rows:
+        indices = np.concatenate([cols for cols, _ in rows])
+        data = np.concatenate([tf for _, tf in rows])
+    else:
+        indices, data = np.zeros(0, dtype=np.int32), np.zeros(0)
+    return sparse.csr_matrix((data, indices, indptr), shape=(len(rows), n_cols)).tocsc()
+
+
+def _widen(matrix: sparse.csc_matrix, n_cols: int) -> sparse.csr_matrix:
+    """Row-major copy padded to n_cols columns, for terms added since it was built."""
+    rows = matrix.tocsr()
+    return sparse.csr_matrix((rows.data, rows.indices, rows.indptr), shape=(rows.shape[0], n_cols))
+
+
+def _squares(matrix: sparse.csc_matrix) -> sparse.csr_matrix:
+    """Squared log-tf values, row-major so norms are a single matrix-vector product."""
+    return matrix.multiply(matrix).tocsr()
+
+
+def _norms(squares: sparse.csr_matrix, idf_squared: np.ndarray) -> np.ndarray:
+    return np.sqrt(squares @ idf_squared[:squares.shape[1]]) + 1e-12
+
+
+class TfidfIndex:
+    """TF-IDF index over problem titles and descriptions as a sparse matrix.
+
+    Rows are problems and columns are terms, holding log-scaled term
+    frequencies in CSC layout so scoring a query only reads the columns of its
+    own terms. IDF weights and row norms are applied at query time as dense
+    vectors. Adding a problem changes the IDF of its terms and so every row
+    norm; norms are recomputed from the squared term frequencies on the first
+    query after a change, which keeps scores exact cosine similarities. New problems go into a small delta matrix; a background thread
+    does the cold build, catches up with other workers' writes, folds the delta
+    into the main matrix and persists it, so requests never wait on that work.
+    """
+
+    def __init__(self, path: str = INDEX_PATH, session_factory=None):
+        self.path = path
+        self._session_factory = session_factory  # Defaults to the app's SessionLocal on first use
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._loaded = False
+        self._stale = False
+        # Highest problem id covered by a DB scan; rows added locally don't move it
+        self._synced_id = 0
+        self._unsaved = 0
+
+        self._vocab: Dict[str, int] = {}
+        self._df = np.zeros(1024, dtype=np.int64)
+        self._doc_terms: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        self._main = _matrix([], 0)
+        self._main_ids = np.zeros(0, dtype=np.int64)
+        self._main_squares = _matrix([], 0).tocsr()
+        self._main_norms = np.zeros(0)
+        self._delta_ids: List[int] = []
+        self._delta = _matrix([], 0)
+        self._delta_squares = self._main_squares
+        self._delta_norms = np.zeros(0)
+        # Bumped whenever document frequencies change; norms are valid for _norms_version
+        self._df_version = 0
+        self._norms_version = -1
+
+    def _idf(self, cols: np.ndarray) -> np.ndarray:
+        return np.log((1 + len(self._doc_terms)) / (1 + self._df[cols])) + 1.0
+
+    def _vectorize_locked(self, counts: Dict[str, int], grow: bool) -> Tuple[np.ndarray, np.ndarray]:
+        cols, tfs = [], []
+        for term, count in counts.items():
+            col = self._vocab.get(term)
+            if col is None:
+                if not grow:
+                    continue
+                col = self._vocab[term] = len(self._vocab)
+                if col >= len(self._df):
+                    self._df = np.concatenate([self._df, np.zeros(len(self._df), dtype=np.int64)])
+            cols.append(col)
+            tfs.append(1.0 + math.log(count))
+        return np.array(cols, dtype=np.int32), np.array(tfs)
+
+    def _add_locked(self, problem_id: int, counts: Dict[str, int]) -> bool:
+        if problem_id in self._doc_terms:
+            return False
+        cols, tfs = self._vectorize_locked(counts, grow=True)
+        self._df[cols] += 1
+        self._df_version += 1
+        self._doc_terms[problem_id] = (cols, tfs)
+        self._delta_ids.append(problem_id)
+        self._unsaved += 1
+        return True
+
+    def _rebuild_delta_locked(self):
+        rows = [self._doc_terms[problem_id] for problem_id in self._delta_ids]
+        self._delta = _matrix(rows, len(self._vocab))
+        self._delta_squares = _squares(self._delta)
+        self._norms_version = -1
+
+    def _refresh_norms_locked(self):
+        if self._norms_version == self._df_version:
+            return
+        idf_squared = self._idf(np.arange(len(self._vocab))) ** 2
+        self._main_norms = _norms(self._main_squares, idf_squared)
+        self._delta_norms = _norms(self._delta_squares, idf_squared)
+        self._norms_version = self._df_version
+
+    def _scores(self, matrix, norms, cols, weights) -> np.ndarray:
+        inside = cols < matrix.shape[1]
+        if not inside.any() or matrix.shape[0] == 0:
+            return np.zeros(matrix.shape[0])
+        return (matrix[:, cols[inside]] @ weights[inside]) / norms
+
+    def _query_locked(self, cols: np.ndarray, tfs: np.ndarray, limit: int, exclude_id: Optional[int] = None):
+        if len(cols) == 0:
+            return []
+        self._refresh_norms_locked()
+        idf = self._idf(cols)
+        query = tfs * idf
+        query_norm = np.linalg.norm(query)
+        # Document weights are tf * idf, so the query side carries idf twice
+        weights = query * idf / query_norm
+        scores = np.concatenate([
+            self._scores(self._main, self._main_norms, cols, weights),
+            self._scores(self._delta, self._delta_norms, cols, weights)
+        ])
+        ids = np.concatenate([self._main_ids, np.array(self._delta_ids, dtype=np.int64)])
+        if exclude_id is not None:
+            scores[ids == exclude_id] = 0.0
+        limit = min(limit, len(scores))
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[i]), float(scores[i])) for i in top if scores[i] > 0]
+
+    def related(self, problem_id: int, limit: int = 5) -> List[Tuple[int, float]]:
+        """Top-k (problem_id, cosine similarity) pairs for an indexed problem."""
+        with self._lock:
+            doc = self._doc_terms.get(problem_id)
+            if doc is None:
+                return []
+            return self._query_locked(doc[0], doc[1], limit, exclude_id=problem_id)
+
+    def search(
+        self, title: str, description: str, limit: int = 5, exclude_id: Optional[int] = None
+    ) -> List[Tuple[int, float]]:
+        with self._lock:
+            cols, tfs = self._vectorize_locked(problem_terms(title, description), grow=False)
+            return self._query_locked(cols, tfs, limit, exclude_id=exclude_id)
+
+    def add(self, problem_id: int, title: str, description: str):
+        if not self._loaded:
+            # The cold load reads committed rows from the DB, this one included
+            self._wake.set()
+            return
+        with self._lock:
+            if self._add_locked(problem_id, problem_terms(title, description)):
+                self._rebuild_delta_locked()
+            busy = len(self._delta_ids) >= COMPACT_EVERY or self._unsaved >= SAVE_EVERY
+        if busy:
+            self._wake.set()
+
+    def invalidate(self):
+        self._stale = True
+        self._wake.set()
+
+    def _load_file(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                if int(data["version"]) != INDEX_VERSION:
+                    return
+                terms = data["terms"].tolist()
+                main = sparse.csc_matrix(
+                    (data["data"], data["indices"], data["indptr"]), shape=tuple(data["shape"])
+                )
+                ids, df, synced_id = data["ids"], data["df"], int(data["synced_id"])
+        except (OSError, ValueError, KeyError):
+            logger.warning("Ignoring unreadable problem index at %s", self.path)
+            return
+        rows = main.tocsr()
+        with self._lock:
+            self._vocab = {term: col for col, term in enumerate(terms)}
+            self._df = np.concatenate([df, np.zeros(max(1024, len(df)), dtype=np.int64)])
+            for row, problem_id in enumerate(ids.tolist()):
+                start, end = rows.indptr[row], rows.indptr[row + 1]
+                self._doc_terms[problem_id] = (rows.indices[start:end], rows.data[start:end])
+            self._main, self._main_ids = main, ids
+            self._main_squares = _squares(main)
+            self._df_version += 1
+            self._synced_id = synced_id
+
+    def _catch_up(self):
+        if self._session_factory is None:
+            from database import SessionLocal
+            self._session_factory = SessionLocal
+        db = self._session_factory()
+        try:
+            self._stale = False
+            rows = db.query(models.Problem.id, models.Problem.title, models.Problem.description).filter(
+                models.Problem.id > self._synced_id
+            ).order_by(models.Problem.id).all()
+        finally:
+            db.close()
+        if not rows:
+            return
+        terms = [(problem_id, problem_terms(title, description)) for problem_id, title, description in rows]
+        with self._lock:
+            for problem_id, counts in terms:
+                self._add_locked(problem_id, counts)
+            self._synced_id = max(self._synced_id, rows[-1][0])
+            self._rebuild_delta_locked()
+
+    def _compact(self):
+        """Fold the delta into the main matrix."""
+        with self._lock:
+            if not self._delta_ids:
+                return
+            main, delta, n_delta = self._main, self._delta, len(self._delta_ids)
+            n_cols = len(self._vocab)
+        # The expensive stacking happens outside the lock; queries keep using the old matrices
+        merged = sparse.vstack([_widen(main, n_cols), _widen(delta, n_cols)], format="csr").tocsc()
+        squares = _squares(merged)
+        with self._lock:
+            self._main = merged
+            self._main_squares = squares
+            self._main_ids = np.concatenate([self._main_ids, np.array(self._delta_ids[:n_delta], dtype=np.int64)])
+            self._delta_ids = self._delta_ids[n_delta:]
+            self._rebuild_delta_locked()
+
+    def save(self):
+        """Write the main matrix to disk; the write itself runs without the lock."""
+        with self._lock:
+            main, ids = self._main, self._main_ids
+            terms = np.array(list(self._vocab), dtype=str)
+            df = self._df[:len(self._vocab)].copy()
+            # Rows still in the delta are not written, so make sure a reload re-reads them
+            synced_id = min([self._synced_id] + [problem_id - 1 for problem_id in self._delta_ids])
+            unsaved = self._unsaved
+        directory = os.path.dirname(os.path.abspath(self.path))
+        # A per-process temp file, since every worker may save at the same time
+        with tempfile.NamedTemporaryFile(dir=directory, prefix="problem_index.", suffix=".tmp", delete=False) as f:
+            np.savez(
+                f, version=INDEX_VERSION, synced_id=synced_id, terms=terms, df=df, ids=ids,
+                data=main.data, indices=main.indices, indptr=main.indptr, shape=np.array(main.shape)
+            )
+        os.replace(f.name, self.path)
+        with self._lock:
+            self._unsaved -= unsaved
+
+    def maintain(self):
+        """One pass of background work: cold load, catch-up, compaction and saving."""
+        if not self._loaded:
+            self._load_file()
+            self._catch_up()
+            self._compact()
+            self._loaded = True
+            if self._unsaved:
+                self.save()
+            return
+        if self._stale:
+            self._catch_up()
+        if len(self._delta_ids) >= COMPACT_EVERY or self._unsaved >= SAVE_EVERY:
+            self._compact()
+        if self._unsaved >= SAVE_EVERY:
+            self.save()
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            try:
+                self.maintain()
+            except Exception:
+                logger.exception("Problem index maintenance failed")
+            self._wake.wait(MAINTENANCE_INTERVAL_SECONDS)
+            self._wake.clear()
+
+    def start(self):
+        """Start background maintenance; safe to call on every request."""
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run_forever, name="problem-index", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+problem_index = TfidfIndex()
@@ -46,25 +46,41 @@ class Problem(BaseModel):
         from_attributes = True
 
 class ProblemWithSolutions(Problem):
-    solutions: List['Solution'] = []
+    solutions: List['SolutionPreview'] = []  # First page only, see solutions_next_cursor
+    solutions_next_cursor: Optional[str] = None  # Continue with /problems/{id}/solutions?cursor=
+
+class RelatedProblem(Problem):
+    similarity: float  # TF-IDF cosine similarity, 0 to 1
 
 # Solution schemas
 class SolutionCreate(BaseModel):
     content: str
     problem_id: int
 
-class Solution(BaseModel):
+class SolutionSummary(BaseModel):
     id: int
-    content: str
     problem_id: int
     solver_id: int
     solver: User
     status: str
     created_at: datetime
+    duplicate_of_id: Optional[int] = None
+    similarity_score: Optional[float] = None  # Closest match from another solver, 1.0 for exact copies
     
     class Config:
         from_attributes = True
 
+class Solution(SolutionSummary):
+    content: str
+
+class SolutionPreview(SolutionSummary):
+    preview: str  # First characters of content; fetch /solutions/{id} for the rest
+    content_length: int
+
+class SolutionPage(BaseModel):
+    items: List[SolutionPreview]
+    next_cursor: Optional[str] = None  # Pass back as ?cursor= for the next page
+
 class SolutionWithProblem(Solution):
     problem: Problem
 
@@ -0,0 +1,193 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import Optional
+import logging
+import os
+import threading
+import uuid
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+import models
+
+logger = logging.getLogger(__name__)
+
+# "sync" settles rewards inside validate_solution; "async" only writes an
+# outbox row there and leaves balances, reputation and transactions to the worker
+SETTLEMENT_MODE = os.getenv("SETTLEMENT_MODE", "sync")
+SETTLEMENT_BATCH_SIZE = int(os.getenv("SETTLEMENT_BATCH_SIZE", "500"))
+SETTLEMENT_INTERVAL_SECONDS = float(os.getenv("SETTLEMENT_INTERVAL_SECONDS", "1.0"))
+# Set to 0 to run the worker only as a separate process (python settlement.py)
+RUN_IN_PROCESS_WORKER = os.getenv("SETTLEMENT_WORKER", "1") == "1"
+
+SOLVER_REPUTATION = 10
+VALIDATOR_REPUTATION = 5
+VALIDATOR_REWARD_RATE = 0.05  # Share of the problem reward paid to the validator
+
+
+def enqueue_settlement(db: Session, solution: models.Solution, problem: models.Problem, validator_id: int):
+    """Record an approved solution's rewards for the worker; committed with the validation."""
+    settlement = models.Settlement(
+        solution_id=solution.id,
+        problem_id=problem.id,
+        solver_id=solution.solver_id,
+        validator_id=validator_id,
+        solver_reward=problem.reward_amount,
+        validator_reward=problem.reward_amount * VALIDATOR_REWARD_RATE
+    )
+    db.add(settlement)
+    return settlement
+
+
+def settle_batch(db: Session, batch_size: int = SETTLEMENT_BATCH_SIZE) -> int:
+    """Apply up to batch_size pending settlements in a single commit.
+
+    Rows are claimed with one conditional UPDATE, so concurrent workers never
+    settle the same row twice. The claim, the aggregated balance and
+    reputation updates and the transaction rows all commit together; a crash
+    before the commit leaves the batch pending for the next run.
+    """
+    batch_id = uuid.uuid4().hex
+    pending_ids = db.query(models.Settlement.id).filter(
+        models.Settlement.settled_at.is_(None)
+    ).order_by(models.Settlement.id).limit(batch_size).scalar_subquery()
+    claimed = db.query(models.Settlement).filter(
+        models.Settlement.id.in_(pending_ids),
+        models.Settlement.settled_at.is_(None)
+    ).update({"settled_at": datetime.utcnow(), "batch_id": batch_id}, synchronize_session=False)
+    if not claimed:
+        db.rollback()
+        return 0
+
+    settlements = db.query(models.Settlement).filter(models.Settlement.batch_id == batch_id).all()
+    titles = dict(db.query(models.Problem.id, models.Problem.title).filter(
+        models.Problem.id.in_({s.problem_id for s in settlements})
+    ))
+
+    balance_deltas = defaultdict(float)
+    reputation_deltas = defaultdict(int)
+    transactions = []
+    for s in settlements:
+        title = titles.get(s.problem_id, "")
+        balance_deltas[s.solver_id] += s.solver_reward
+        reputation_deltas[s.solver_id] += SOLVER_REPUTATION
+        balance_deltas[s.validator_id] += s.validator_reward
+        reputation_deltas[s.validator_id] += VALIDATOR_REPUTATION
+        transactions.append(models.Transaction(
+            user_id=s.solver_id, type="solution_reward", amount=s.solver_reward,
+            description=f"Solution approved for: {title}"[:200],
+            problem_id=s.problem_id, solution_id=s.solution_id
+        ))
+        transactions.append(models.Transaction(
+            user_id=s.validator_id, type="validation_reward", amount=s.validator_reward,
+            description=f"Validated solution for: {title}"[:200],
+            problem_id=s.problem_id, solution_id=s.solution_id
+        ))
+
+    # One UPDATE per user however many of their rewards are in the batch
+    for user_id, amount in balance_deltas.items():
+        db.query(models.User).filter(models.User.id == user_id).update({
+            "token_balance": models.User.token_balance + amount,
+            "reputation": models.User.reputation + reputation_deltas[user_id]
+        }, synchronize_session=False)
+    db.add_all(transactions)
+    db.commit()
+    return len(settlements)
+
+
+def settlement_lag(db: Session):
+    """Pending settlement count and age in seconds of the oldest one."""
+    oldest = db.query(models.Settlement.created_at).filter(
+        models.Settlement.settled_at.is_(None)
+    ).order_by(models.Settlement.id).first()
+    pending = db.query(models.Settlement).filter(models.Settlement.settled_at.is_(None)).count()
+    lag_seconds = (datetime.utcnow() - oldest.created_at).total_seconds() if oldest else 0.0
+    return {"pending": pending, "lag_seconds": max(0.0, lag_seconds)}
+
+
+def settlement_stats(db: Session):
+    """Queue and throughput figures read from the settlements table.
+
+    Derived from settled_at and batch_id rather than worker counters, so every
+    API process reports the same numbers whichever process did the settling.
+    """
+    last = db.query(models.Settlement.batch_id, models.Settlement.settled_at).filter(
+        models.Settlement.settled_at.isnot(None)
+    ).order_by(models.Settlement.settled_at.desc(), models.Settlement.id.desc()).first()
+    last_batch_size = 0
+    if last:
+        last_batch_size = db.query(models.Settlement).filter(models.Settlement.batch_id == last.batch_id).count()
+    total_settled = db.query(models.Settlement).filter(models.Settlement.settled_at.isnot(None)).count()
+    return {
+        "mode": SETTLEMENT_MODE,
+        **settlement_lag(db),
+        "last_batch_size": last_batch_size,
+        "last_settled_at": last.settled_at if last else None,
+        "total_settled": total_settled
+    }
+
+
+class SettlementWorker:
+    """Background thread draining the settlement outbox in batches."""
+
+    def __init__(self, batch_size: int = SETTLEMENT_BATCH_SIZE, interval: float = SETTLEMENT_INTERVAL_SECONDS):
+        self.batch_size = batch_size
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self) -> int:
+        from database import SessionLocal
+        settled = 0
+        db = SessionLocal()
+        try:
+            while not self._stop.is_set():
+                try:
+                    count = settle_batch(db, self.batch_size)
+                except OperationalError:
+                    # Another writer holds the SQLite lock; retry on the next tick
+                    db.rollback()
+                    logger.warning("Settlement batch deferred: database is busy")
+                    break
+                settled += count
+                if count < self.batch_size:
+                    break
+        finally:
+            db.close()
+        return settled
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Settlement batch failed")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run_forever, name="settlement-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+settlement_worker = SettlementWorker()
+
+
+if __name__ == "__main__":
+    # Run the worker as its own process, e.g. alongside several API workers
+    from database import create_tables
+
+    logging.basicConfig(level=logging.INFO)
+    create_tables()
+    try:
+        settlement_worker.run_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,49 @@
+import os
+import tempfile
+import uuid
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import models
+
+# main.py and database.py bind to their database at import time, so point them
+# at a throwaway directory before any test module imports them
+_APP_DIR = tempfile.mkdtemp(prefix="poi-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_APP_DIR}/app.db"
+os.environ["PROBLEM_INDEX_PATH"] = f"{_APP_DIR}/problem_index.npz"
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / "test.db"
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(bind=engine)
+    engine.dispose()
+    return path
+
+
+@pytest.fixture
+def db(db_path):
+    engine = create_engine(f"sqlite:///{db_path}")
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+    import main
+    # Without the context manager the lifespan's background threads stay off
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def auth_headers(client):
+    """Bearer headers for a freshly signed-up user with the starting balance."""
+    username = f"user-{uuid.uuid4().hex[:12]}"
+    response = client.post("/auth/signup", json={"username": username, "password": "secret"})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
@@ -0,0 +1,129 @@
+import pytest
+
+import models
+from dedup import (
+    DUPLICATE_THRESHOLD, backfill_duplicates, check_duplicate, compute_minhash,
+    estimate_similarity, pack_signature, solution_index
+)
+
+ORIGINAL = (
+    "Store refresh tokens server side keyed by a random identifier and rotate them on every use. "
+    "When a refresh token is presented twice revoke the whole token family because it was leaked. "
+    "Access tokens stay short lived and are validated without a database lookup on each request. "
+    "Refresh requests go to a dedicated endpoint that sets the new token in an http only cookie."
+)
+# One word changed near the end
+NEAR_COPY = ORIGINAL.replace("http only cookie", "http only header")
+# Shares the opening sentence only
+LOOSE_COPY = ORIGINAL.split(". ")[0] + (
+    ". Sessions are kept in redis with a sliding expiry and the client polls a heartbeat endpoint "
+    "so idle users are logged out after fifteen minutes without any token exchange at all."
+)
+
+
+@pytest.fixture(autouse=True)
+def empty_index():
+    solution_index.clear()
+    yield
+    solution_index.clear()
+
+
+@pytest.fixture
+def problem(db):
+    author = models.User(username="author", hashed_password="x")
+    db.add(author)
+    db.flush()
+    problem = models.Problem(title="Token refresh", description="How?", author_id=author.id)
+    db.add(problem)
+    db.commit()
+    return problem
+
+
+def make_user(db, username):
+    user = models.User(username=username, hashed_password="x")
+    db.add(user)
+    db.commit()
+    return user
+
+
+def submit(db, problem, solver, content):
+    """Store a solution the way submit_solution does."""
+    digest, signature, duplicate_of_id, score = check_duplicate(db, content, solver.id)
+    solution = models.Solution(
+        content=content, problem_id=problem.id, solver_id=solver.id, content_hash=digest,
+        minhash_signature=pack_signature(signature) if signature else None,
+        duplicate_of_id=duplicate_of_id, similarity_score=score
+    )
+    db.add(solution)
+    db.commit()
+    if signature:
+        solution_index.insert(solution.id, solver.id, signature)
+    return solution
+
+
+def test_exact_copy_from_other_solver_is_flagged(db, problem):
+    original = submit(db, problem, make_user(db, "alice"), ORIGINAL)
+    # Case and punctuation are normalized away before hashing
+    copy = submit(db, problem, make_user(db, "bob"), ORIGINAL.upper().replace(".", "!"))
+
+    assert copy.duplicate_of_id == original.id
+    assert copy.similarity_score == 1.0
+    assert original.duplicate_of_id is None
+
+
+def test_copies_by_same_solver_are_ignored(db, problem):
+    alice = make_user(db, "alice")
+    submit(db, problem, alice, ORIGINAL)
+
+    again = submit(db, problem, alice, ORIGINAL)
+
+    assert again.duplicate_of_id is None
+
+
+def test_near_copy_above_threshold_is_flagged(db, problem):
+    original = submit(db, problem, make_user(db, "alice"), ORIGINAL)
+
+    near = submit(db, problem, make_user(db, "bob"), NEAR_COPY)
+
+    assert near.duplicate_of_id == original.id
+    assert DUPLICATE_THRESHOLD <= near.similarity_score < 1.0
+
+
+def test_loose_copy_below_threshold_is_not_flagged(db, problem):
+    submit(db, problem, make_user(db, "alice"), ORIGINAL)
+    assert estimate_similarity(compute_minhash(ORIGINAL), compute_minhash(LOOSE_COPY)) < DUPLICATE_THRESHOLD
+
+    loose = submit(db, problem, make_user(db, "bob"), LOOSE_COPY)
+
+    assert loose.duplicate_of_id is None
+    assert loose.similarity_score < DUPLICATE_THRESHOLD
+
+
+def test_content_without_word_characters_is_never_flagged(db, problem):
+    first = submit(db, problem, make_user(db, "alice"), "!!! ???")
+
+    second = submit(db, problem, make_user(db, "bob"), "   ...  ")
+
+    assert first.minhash_signature is None
+    assert second.duplicate_of_id is None
+    assert second.similarity_score == 0.0
+
+
+def test_backfill_only_points_at_earlier_rows(db, problem):
+    alice, bob, carol = make_user(db, "alice"), make_user(db, "bob"), make_user(db, "carol")
+    # Rows from before duplicate detection existed have no fingerprint yet
+    rows = [
+        models.Solution(content=content, problem_id=problem.id, solver_id=solver.id)
+        for solver, content in [(alice, ORIGINAL), (bob, ORIGINAL), (carol, NEAR_COPY), (alice, "!!!")]
+    ]
+    db.add_all(rows)
+    db.commit()
+
+    assert backfill_duplicates(db, batch_size=2) == 4
+
+    first, exact, near, empty = rows
+    assert first.duplicate_of_id is None
+    assert (exact.duplicate_of_id, exact.similarity_score) == (first.id, 1.0)
+    assert near.duplicate_of_id in (first.id, exact.id)
+    assert empty.duplicate_of_id is None and empty.minhash_signature is None
+    assert all(row.content_hash is not None for row in rows)
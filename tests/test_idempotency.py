@@ -0,0 +1,109 @@
+from datetime import datetime
+import asyncio
+
+import httpx
+from sqlalchemy.orm import Session
+
+import models
+from idempotency import IDEMPOTENCY_HEADER, KEY_TTL, REPLAY_HEADER, IdempotentRequest
+import schemas
+
+PROBLEM = {"title": "Idempotent problem", "description": "Posted with a retry", "reward_amount": 10}
+
+
+def balance(client, headers):
+    return client.get("/users/me", headers=headers).json()["token_balance"]
+
+
+def problem_count(title):
+    from database import SessionLocal
+    with SessionLocal() as db:
+        return db.query(models.Problem).filter(models.Problem.title == title).count()
+
+
+def test_replay_returns_identical_response_without_debiting_again(client, auth_headers):
+    headers = {**auth_headers, IDEMPOTENCY_HEADER: "replay-key"}
+    payload = {**PROBLEM, "title": "replay problem"}
+
+    first = client.post("/problems", json=payload, headers=headers)
+    retry = client.post("/problems", json=payload, headers=headers)
+
+    assert first.status_code == retry.status_code == 200
+    assert retry.content == first.content
+    assert retry.headers[REPLAY_HEADER] == "true"
+    assert REPLAY_HEADER not in first.headers
+    assert balance(client, auth_headers) == 90.0
+    assert problem_count("replay problem") == 1
+
+
+def test_key_reused_with_different_body_is_rejected(client, auth_headers):
+    headers = {**auth_headers, IDEMPOTENCY_HEADER: "mismatch-key"}
+    client.post("/problems", json=PROBLEM, headers=headers)
+
+    response = client.post("/problems", json={**PROBLEM, "reward_amount": 20}, headers=headers)
+
+    assert response.status_code == 422
+    assert balance(client, auth_headers) == 90.0
+
+
+def test_expired_key_is_executed_again(client, auth_headers):
+    from database import SessionLocal
+    headers = {**auth_headers, IDEMPOTENCY_HEADER: "expiring-key"}
+    first = client.post("/problems", json=PROBLEM, headers=headers)
+    with SessionLocal() as db:
+        db.query(models.IdempotencyKey).filter(models.IdempotencyKey.key == "expiring-key").update({
+            "created_at": datetime.utcnow() - KEY_TTL - KEY_TTL / 24
+        })
+        db.commit()
+
+    second = client.post("/problems", json=PROBLEM, headers=headers)
+
+    assert second.status_code == 200
+    assert REPLAY_HEADER not in second.headers
+    assert second.json()["id"] != first.json()["id"]
+    assert balance(client, auth_headers) == 80.0
+
+
+def test_key_committed_by_other_process_returns_stored_response(db: Session):
+    user = models.User(username="racer", hashed_password="x")
+    db.add(user)
+    db.commit()
+    payload = schemas.ProblemCreate(**PROBLEM)
+    request = IdempotentRequest(db, user.id, "raced-key")
+    assert request.replay("POST /problems", payload) is None
+
+    # Another worker finishes the same request between our replay check and commit
+    stored_body = b'{"stored": true}'
+    with Session(db.get_bind()) as other:
+        other.add(models.IdempotencyKey(
+            user_id=user.id, key="raced-key", endpoint=request.endpoint,
+            request_hash=request.request_hash, status_code=200, response_body=stored_body
+        ))
+        other.commit()
+    problem = models.Problem(title="loser", description="rolled back", author_id=user.id)
+    db.add(problem)
+    response = request.commit(problem, schemas.Problem)
+
+    assert response.body == stored_body
+    assert response.headers[REPLAY_HEADER] == "true"
+    assert db.query(models.Problem).filter(models.Problem.title == "loser").count() == 0
+
+
+def test_concurrent_identical_requests_create_one_problem(client, auth_headers):
+    import main
+    headers = {**auth_headers, IDEMPOTENCY_HEADER: "concurrent-key"}
+    payload = {**PROBLEM, "title": "concurrent problem"}
+
+    async def send_all():
+        # One event loop, as in a uvicorn worker; sync endpoints still run in parallel threads
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            return await asyncio.gather(*[http.post("/problems", json=payload, headers=headers) for _ in range(8)])
+
+    responses = asyncio.run(send_all())
+
+    assert [response.status_code for response in responses] == [200] * 8
+    assert len({response.json()["id"] for response in responses}) == 1
+    assert sum(REPLAY_HEADER in response.headers for response in responses) == 7
+    assert problem_count("concurrent problem") == 1
+    assert balance(client, auth_headers) == 90.0
@@ -0,0 +1,74 @@
+from pathlib import Path
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+from sqlalchemy import create_engine
+
+from invalidation import TOPIC_PROBLEMS, TOPIC_SOLUTIONS, CacheInvalidator
+
+INTERVAL = 0.05
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+# Stands in for another uvicorn worker: its own process and its own engine
+BUMP_SCRIPT = """
+import sys
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from invalidation import bump_version
+
+engine = create_engine(f"sqlite:///{sys.argv[1]}")
+with Session(engine) as db:
+    bump_version(db, sys.argv[2])
+    db.commit()
+"""
+
+
+@pytest.fixture
+def invalidator(db_path):
+    engine = create_engine(f"sqlite:///{db_path}")
+    invalidator = CacheInvalidator(interval=INTERVAL, engine=engine)
+    yield invalidator
+    invalidator.stop()
+    engine.dispose()
+
+
+def bump_in_other_process(db_path, topic):
+    subprocess.run([sys.executable, "-c", BUMP_SCRIPT, str(db_path), topic], cwd=REPO_ROOT, check=True)
+
+
+def test_callback_fires_after_commit_in_other_process(db_path, invalidator):
+    fired = threading.Event()
+    invalidator.register(TOPIC_PROBLEMS, fired.set)
+    invalidator.start()
+
+    bump_in_other_process(db_path, TOPIC_PROBLEMS)
+    committed_at = time.monotonic()
+
+    # One poll interval plus some slack for thread scheduling
+    assert fired.wait(INTERVAL * 10)
+    assert time.monotonic() - committed_at < INTERVAL * 10
+
+
+def test_only_changed_topics_fire(db_path, invalidator):
+    fired = []
+    invalidator.register(TOPIC_PROBLEMS, lambda: fired.append(TOPIC_PROBLEMS))
+    invalidator.register(TOPIC_SOLUTIONS, lambda: fired.append(TOPIC_SOLUTIONS))
+    invalidator.poll()  # Baseline
+
+    bump_in_other_process(db_path, TOPIC_SOLUTIONS)
+
+    assert invalidator.poll() == [TOPIC_SOLUTIONS]
+    assert fired == [TOPIC_SOLUTIONS]
+    assert invalidator.poll() == []
+
+
+def test_first_poll_only_sets_baseline(db_path, invalidator):
+    bump_in_other_process(db_path, TOPIC_PROBLEMS)
+    fired = []
+    invalidator.register(TOPIC_PROBLEMS, lambda: fired.append(TOPIC_PROBLEMS))
+
+    assert invalidator.poll() == []
+    assert fired == []
@@ -0,0 +1,115 @@
+from collections import Counter
+import math
+import random
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import models
+from related import COMPACT_EVERY, TfidfIndex, problem_terms
+
+WORDS = [f"term{i}" for i in range(400)]
+
+
+def random_problem(rng):
+    title = " ".join(rng.choices(WORDS[:50], k=4))
+    description = " ".join(rng.choices(WORDS, weights=[1 / (i + 1) for i in range(len(WORDS))], k=40))
+    return title, description
+
+
+def brute_force_related(docs, problem_id, limit):
+    """Cosine similarity of TF-IDF vectors computed from scratch, one dict per document."""
+    terms = {pid: problem_terms(title, description) for pid, (title, description) in docs.items()}
+    df = Counter(term for counts in terms.values() for term in counts)
+    n = len(terms)
+
+    def vector(counts):
+        return {
+            term: (1 + math.log(count)) * (math.log((1 + n) / (1 + df[term])) + 1)
+            for term, count in counts.items()
+        }
+
+    vectors = {pid: vector(counts) for pid, counts in terms.items()}
+    norms = {pid: math.sqrt(sum(w * w for w in v.values())) for pid, v in vectors.items()}
+    query = vectors[problem_id]
+    scores = []
+    for pid, v in vectors.items():
+        if pid == problem_id:
+            continue
+        dot = sum(w * v.get(term, 0.0) for term, w in query.items())
+        scores.append((pid, dot / (norms[pid] * norms[problem_id])))
+    scores.sort(key=lambda item: -item[1])
+    return scores[:limit]
+
+
+@pytest.fixture
+def session_factory(db_path):
+    engine = create_engine(f"sqlite:///{db_path}")
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def insert_problems(session_factory, docs):
+    with session_factory() as db:
+        for pid, (title, description) in docs.items():
+            db.add(models.Problem(id=pid, title=title, description=description, author_id=1))
+        db.commit()
+
+
+def assert_matches_brute_force(index, docs, sample):
+    for problem_id in sample:
+        expected = brute_force_related(docs, problem_id, 10)
+        actual = index.related(problem_id, limit=10)
+        assert [pid for pid, _ in actual] == [pid for pid, _ in expected]
+        np.testing.assert_allclose([s for _, s in actual], [s for _, s in expected], rtol=1e-9)
+
+
+def test_scores_are_exact_cosine_after_growth(tmp_path, session_factory):
+    rng = random.Random(7)
+    docs = {pid: random_problem(rng) for pid in range(1, 801)}
+    insert_problems(session_factory, docs)
+    index = TfidfIndex(path=str(tmp_path / "index.npz"), session_factory=session_factory)
+    index.maintain()  # Cold build straight into the main matrix
+    assert_matches_brute_force(index, docs, [1])
+
+    # Enough new problems to shift every IDF, some folded into the main matrix and some still in the delta
+    for pid in range(801, 801 + COMPACT_EVERY):
+        docs[pid] = random_problem(rng)
+        index.add(pid, *docs[pid])
+    index.maintain()
+    assert_matches_brute_force(index, docs, [2])
+    for pid in range(801 + COMPACT_EVERY, 851 + COMPACT_EVERY):
+        docs[pid] = random_problem(rng)
+        index.add(pid, *docs[pid])
+    assert index._delta_ids
+
+    assert_matches_brute_force(index, docs, rng.sample(sorted(docs), 25))
+
+
+def test_reloaded_index_matches_brute_force(tmp_path, session_factory):
+    rng = random.Random(11)
+    docs = {pid: random_problem(rng) for pid in range(1, 301)}
+    insert_problems(session_factory, docs)
+    path = str(tmp_path / "index.npz")
+    TfidfIndex(path=path, session_factory=session_factory).maintain()
+
+    # Problems written after the save are caught up from the DB on load
+    later = {pid: random_problem(rng) for pid in range(301, 341)}
+    insert_problems(session_factory, later)
+    docs.update(later)
+    index = TfidfIndex(path=path, session_factory=session_factory)
+    index.maintain()
+
+    assert_matches_brute_force(index, docs, rng.sample(sorted(docs), 15))
+
+
+def test_search_excludes_given_problem(tmp_path, session_factory):
+    docs = {1: ("binary tree balance", "rebalance a binary search tree"), 2: ("cook pasta", "boil water")}
+    insert_problems(session_factory, docs)
+    index = TfidfIndex(path=str(tmp_path / "index.npz"), session_factory=session_factory)
+    index.maintain()
+
+    assert [pid for pid, _ in index.search(*docs[1])] == [1]
+    assert index.search(*docs[1], exclude_id=1) == []
@@ -0,0 +1,144 @@
+from datetime import datetime, timedelta
+import uuid
+
+import pytest
+
+import models
+from settlement import (
+    SETTLEMENT_MODE, SOLVER_REPUTATION, VALIDATOR_REPUTATION, VALIDATOR_REWARD_RATE, enqueue_settlement,
+    settle_batch, settlement_lag, settlement_stats
+)
+
+
+@pytest.fixture
+def users(db):
+    users = {
+        name: models.User(username=name, hashed_password="x", token_balance=100.0, reputation=0)
+        for name in ("author", "alice", "bob", "validator")
+    }
+    db.add_all(users.values())
+    db.commit()
+    return users
+
+
+def approve(db, users, solver, reward):
+    """Queue rewards for a new approved solution, as validate_solution does in async mode."""
+    problem = models.Problem(title=f"Problem {reward}", description="d", author_id=users["author"].id, reward_amount=reward)
+    db.add(problem)
+    db.flush()
+    solution = models.Solution(content="s", problem_id=problem.id, solver_id=users[solver].id, status="approved")
+    db.add(solution)
+    db.flush()
+    enqueue_settlement(db, solution, problem, users["validator"].id)
+    db.commit()
+    return solution
+
+
+def balances(db, users):
+    db.expire_all()
+    return {name: (user.token_balance, user.reputation) for name, user in users.items()}
+
+
+def test_batch_aggregates_rewards_per_user(db, users):
+    approve(db, users, "alice", 10.0)
+    approve(db, users, "alice", 30.0)
+    approve(db, users, "bob", 20.0)
+
+    assert settle_batch(db) == 3
+
+    validator_reward = 60.0 * VALIDATOR_REWARD_RATE
+    assert balances(db, users) == {
+        "author": (100.0, 0),
+        "alice": (140.0, 2 * SOLVER_REPUTATION),
+        "bob": (120.0, SOLVER_REPUTATION),
+        "validator": (pytest.approx(100.0 + validator_reward), 3 * VALIDATOR_REPUTATION),
+    }
+    transactions = db.query(models.Transaction).all()
+    assert sorted(t.type for t in transactions) == ["solution_reward"] * 3 + ["validation_reward"] * 3
+    assert sum(t.amount for t in transactions if t.user_id == users["alice"].id) == 40.0
+
+
+def test_settling_twice_pays_once(db, users):
+    approve(db, users, "alice", 10.0)
+    assert settle_batch(db) == 1
+    after_first = balances(db, users)
+
+    assert settle_batch(db) == 0
+
+    assert balances(db, users) == after_first
+    assert db.query(models.Transaction).count() == 2
+
+
+def test_batch_rolled_back_before_commit_stays_pending(db, users, monkeypatch):
+    approve(db, users, "alice", 10.0)
+    before = balances(db, users)
+
+    def crash():
+        raise RuntimeError("worker died before commit")
+
+    monkeypatch.setattr(db, "commit", crash)
+    with pytest.raises(RuntimeError):
+        settle_batch(db)
+    db.rollback()
+    monkeypatch.undo()
+
+    assert settlement_lag(db)["pending"] == 1
+    assert balances(db, users) == before
+    assert db.query(models.Transaction).count() == 0
+    # The next run picks the row up again
+    assert settle_batch(db) == 1
+    assert balances(db, users)["alice"] == (110.0, SOLVER_REPUTATION)
+
+
+def test_lag_and_stats_reflect_settlements_table(db, users):
+    assert settlement_stats(db) == {
+        "mode": SETTLEMENT_MODE, "pending": 0, "lag_seconds": 0.0,
+        "last_batch_size": 0, "last_settled_at": None, "total_settled": 0
+    }
+    for reward in (10.0, 20.0, 30.0):
+        approve(db, users, "alice", reward)
+    # Backdate the oldest one so the lag is measurable
+    oldest = db.query(models.Settlement).order_by(models.Settlement.id).first()
+    oldest.created_at = datetime.utcnow() - timedelta(minutes=5)
+    db.commit()
+
+    lag = settlement_lag(db)
+    assert lag["pending"] == 3
+    assert 300 <= lag["lag_seconds"] < 360
+
+    assert settle_batch(db, batch_size=2) == 2
+    assert settle_batch(db, batch_size=2) == 1
+
+    stats = settlement_stats(db)
+    assert stats["pending"] == 0 and stats["lag_seconds"] == 0.0
+    assert stats["total_settled"] == 3
+    assert stats["last_batch_size"] == 1
+    latest = db.query(models.Settlement).order_by(models.Settlement.id.desc()).first()
+    assert stats["last_settled_at"] == latest.settled_at
+
+
+def test_concurrent_async_approval_is_rejected(client, auth_headers, monkeypatch):
+    import main
+    from database import SessionLocal
+    monkeypatch.setattr(main, "SETTLEMENT_MODE", "async")
+    problem = client.post("/problems", json={"title": "Race", "description": "d"}, headers=auth_headers).json()
+    solver = client.post("/auth/signup", json={"username": f"solver-{uuid.uuid4().hex[:12]}", "password": "secret"}).json()
+    solution = client.post(
+        "/solutions", json={"content": "an answer", "problem_id": problem["id"]},
+        headers={"Authorization": f"Bearer {solver['access_token']}"}
+    ).json()
+    # The other validator's approval has queued the rewards but this one already saw "pending"
+    with SessionLocal() as db:
+        row = db.get(models.Solution, solution["id"])
+        enqueue_settlement(db, row, db.get(models.Problem, problem["id"]), 1)
+        db.commit()
+
+    response = client.post(
+        "/validations", json={"solution_id": solution["id"], "decision": "approved"}, headers=auth_headers
+    )
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Solution has already been validated"
+    with SessionLocal() as db:
+        assert db.query(models.Validation).filter(models.Validation.solution_id == solution["id"]).count() == 0
+        assert db.query(models.Settlement).filter(models.Settlement.solution_id == solution["id"]).count() == 1